@@ -8,25 +8,57 @@ Extract all scenes from a Leica .lif and save per-channel Z-stacks as OME-TIFF.
 - Works both as an importable module (call split_lif_to_channels) and as a CLI.
 
 Requirements:
-    pip install bioio bioio-lif bioio-ome-tiff numpy
+    pip install bioio bioio-lif tifffile numpy
 """
 
 from __future__ import annotations
 import argparse
+import copy
 import re
 from pathlib import Path
 from typing import Iterable, List, Optional
 
+import dask
 import numpy as np
+import tifffile
+from lxml import etree
 from bioio import BioImage
-from bioio_ome_tiff.writers import OmeTiffWriter
 import bioio_lif  # if you want to force the LIF reader, uncomment and pass reader=bioio_lif.Reader
 
+try:
+    # Optional accelerator: a parallel JIT kernel for the uint16 -> uint8
+    # quantize keeps each slab in cache across cores instead of a single
+    # serial sweep. Everything works without numba installed.
+    from numba import njit, prange
+
+    @njit(parallel=True, cache=True)
+    def _quantize_u16_to_u8(src, dst):
+        for z in prange(src.shape[0]):
+            for y in range(src.shape[1]):
+                for x in range(src.shape[2]):
+                    dst[z, y, x] = src[z, y, x] >> 8
+except ImportError:
+    _quantize_u16_to_u8 = None
+
+
+# Buffer size for TIFF output files. The default 8 KiB Python buffer means a
+# syscall every few tiles, which hurts badly on network shares (SMB/NFS);
+# 8 MiB batches those writes into a handful of large ones.
+_WRITE_BUFFER_BYTES = 8 << 20
+
+# Aggregate budget for whole-CZYX batch reads (one reader dispatch per
+# timepoint instead of one per channel). Concurrent export tasks each hold
+# their own block plus a cast copy, so every task gets an equal share of this
+# budget; blocks over their share fall back to per-channel reads.
+_BATCH_READ_LIMIT_BYTES = 2 << 30
+
+
+# Compiled once; _safe runs per scene and per channel inside the export loop
+_UNSAFE_RE = re.compile(r"[^\w\-.]+")
 
 def _safe(name: str) -> str:
     """Make a filesystem-safe name."""
-    name = re.sub(r"[^\w\-.]+", "_", str(name))
-    return name.strip("_") or "unnamed"
+    return _UNSAFE_RE.sub("_", str(name)).strip("_") or "unnamed"
 
 def _dim_labels(dims) -> list[str]:
     """
@@ -38,6 +70,205 @@ def _dim_labels(dims) -> list[str]:
         return list(order)
     return list(str(order))
 
+def _cast_stack(arr: np.ndarray, target, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Cast an image stack to ``target`` without silent overflow.
+
+    ``ndarray.astype`` wraps on narrowing integer casts (uint16 values > 255
+    alias under uint8). Instead, uint16 -> uint8 keeps the high byte
+    (value >> 8), so full-range uint16 maps onto full-range uint8, and float
+    sources are clipped to the integer target's range. Widening and float
+    casts are plain copies. All paths write through ``out=`` in one
+    SIMD-vectorized pass, optionally into a caller-provided buffer.
+    """
+    target = np.dtype(target)
+    if arr.dtype == target:
+        return arr
+    if out is None:
+        out = np.empty(arr.shape, dtype=target)
+    if arr.dtype == np.uint16 and target == np.uint8:
+        if _quantize_u16_to_u8 is not None and arr.flags.c_contiguous:
+            _quantize_u16_to_u8(arr.reshape(-1, *arr.shape[-2:]), out.reshape(-1, *out.shape[-2:]))
+        else:
+            np.right_shift(arr, 8, out=out, casting="unsafe")
+    elif arr.dtype.kind == "f" and target.kind in "iu":
+        np.clip(arr, np.iinfo(target).min, np.iinfo(target).max, out=out, casting="unsafe")
+    else:
+        np.copyto(out, arr, casting="unsafe")
+    return out
+
+
+def _quantize_calibrated_u8(arr: np.ndarray) -> tuple[np.ndarray, float, float]:
+    """Lossy per-channel quantization to uint8.
+
+    Rescales the 0.5th-99.5th percentile range of ``arr`` onto 0-255 and
+    clips the tails. Returns the quantized stack plus the (lo, hi)
+    calibration bounds so they can be logged alongside the output.
+    """
+    lo, hi = np.percentile(arr, (0.5, 99.5))
+    if hi <= lo:
+        hi = lo + 1.0
+    scaled = np.clip((arr - lo) * (255.0 / (hi - lo)), 0, 255)
+    return scaled.astype(np.uint8), float(lo), float(hi)
+
+
+# OME 2016-06 namespace, used when rewriting per-channel OME-XML
+_OME_NS = "{http://www.openmicroscopy.org/Schemas/OME/2016-06}"
+
+# OME Pixels@Type names for the dtypes we can land on disk
+_OME_PIXEL_TYPES = {
+    "uint8": "uint8", "uint16": "uint16", "uint32": "uint32",
+    "int8": "int8", "int16": "int16", "int32": "int32",
+    "float32": "float", "float64": "double",
+}
+
+
+def _channel_ome_xml(scene_tree, scene_index: int, c: int, zyx: np.ndarray,
+                     calibration: Optional[tuple[float, float]] = None) -> Optional[bytes]:
+    """Derive single-channel OME-XML from a scene's parsed metadata tree.
+
+    Clones the cached lxml tree, keeps only image ``scene_index`` and channel
+    ``c``, and fixes the Pixels dimensions/type to match the ZYX stack being
+    written. When ``calibration`` holds the (lo, hi) bounds of an int8_calib
+    rescale, they are recorded as a CommentAnnotation referenced from the
+    channel so the lossy mapping stays recoverable from the file itself.
+    Returns None when the metadata cannot be rewritten (e.g. a dtype with no
+    OME pixel type), in which case the caller lets tifffile generate the
+    OME-XML from scratch instead.
+    """
+    pixel_type = _OME_PIXEL_TYPES.get(np.dtype(zyx.dtype).name)
+    if pixel_type is None:
+        return None
+    try:
+        tree = copy.deepcopy(scene_tree)
+        images = tree.findall(f"{_OME_NS}Image")
+        image = images[scene_index] if scene_index < len(images) else images[0]
+        for other in images:
+            if other is not image:
+                tree.remove(other)
+        pixels = image.find(f"{_OME_NS}Pixels")
+        channels = pixels.findall(f"{_OME_NS}Channel")
+        for i, channel in enumerate(channels):
+            if i != c:
+                pixels.remove(channel)
+        # Plane/TiffData entries describe the original multi-channel layout;
+        # drop them and declare one contiguous block
+        for stale in pixels.findall(f"{_OME_NS}TiffData") + pixels.findall(f"{_OME_NS}Plane"):
+            pixels.remove(stale)
+        etree.SubElement(pixels, f"{_OME_NS}TiffData")
+        pixels.set("DimensionOrder", "XYZCT")
+        pixels.set("SizeT", "1")
+        pixels.set("SizeC", "1")
+        pixels.set("SizeZ", str(zyx.shape[0]))
+        pixels.set("SizeY", str(zyx.shape[1]))
+        pixels.set("SizeX", str(zyx.shape[2]))
+        pixels.set("Type", pixel_type)
+        if calibration is not None:
+            lo, hi = calibration
+            annotation_id = "Annotation:Int8CalibBounds0"
+            annotations = tree.find(f"{_OME_NS}StructuredAnnotations")
+            if annotations is None:
+                annotations = etree.SubElement(tree, f"{_OME_NS}StructuredAnnotations")
+            comment = etree.SubElement(annotations, f"{_OME_NS}CommentAnnotation", ID=annotation_id)
+            value = etree.SubElement(comment, f"{_OME_NS}Value")
+            value.text = (f"int8_calib: lo={lo:.9g} hi={hi:.9g}; "
+                          "uint8 value v maps back to lo + v*(hi-lo)/255")
+            for channel in pixels.findall(f"{_OME_NS}Channel"):
+                etree.SubElement(channel, f"{_OME_NS}AnnotationRef", ID=annotation_id)
+        # UTF-8 bytes, not str: tifffile encodes str tags as 7-bit ASCII and
+        # Leica OME-XML routinely contains e.g. PhysicalSizeXUnit="µm"
+        return etree.tostring(tree)
+    except Exception:
+        return None
+
+
+def _export_timepoint(
+    lif_path: Path,
+    scene: str,
+    t: int,
+    has_t: bool,
+    channel_paths: list[Path],
+    dtype: str,
+    target_dtype,
+    bigtiff: bool,
+    batch_read: bool,
+    verbose: bool,
+    img: Optional[BioImage] = None,
+) -> list[Path]:
+    """Write every channel of one (scene, timepoint) to its own OME-TIFF.
+
+    Runs as a dask task. Opens its own BioImage because the reader's current
+    scene is mutable state that cannot be shared between concurrent tasks; a
+    caller running a single task may pass its already-open ``img`` instead.
+    """
+    if img is None:
+        img = BioImage(str(lif_path), reader=bioio_lif.Reader)
+    img.set_scene(scene)
+
+    # Parse the scene's OME-XML once and specialize it per channel below;
+    # letting the writer regenerate it for every output roughly doubles the
+    # per-file init cost on multi-channel scenes
+    try:
+        scene_tree = etree.fromstring(img.ome_metadata.to_xml().encode())
+        scene_index = img.current_scene_index
+    except Exception:
+        scene_tree = None
+        scene_index = 0
+
+    # Fetch the whole CZYX block for this timepoint once (one reader dispatch
+    # instead of one per channel) unless it was judged too large upfront
+    czyx = None
+    if batch_read:
+        czyx = img.get_image_data("CZYX", T=t) if has_t else img.get_image_data("CZYX")
+        # Cast the whole block once instead of once per channel
+        # (int8_calib is calibrated per channel, so it stays downstream)
+        if dtype not in ("native", "int8_calib"):
+            czyx = _cast_stack(czyx, target_dtype)
+
+    written: list[Path] = []
+    for c, out_path in enumerate(channel_paths):
+        if czyx is not None:
+            zyx = czyx[c]
+        elif has_t:
+            zyx = img.get_image_data("ZYX", T=t, C=c)
+        else:
+            zyx = img.get_image_data("ZYX", C=c)
+
+        # Optional dtype cast (no-op when the batched block was pre-cast)
+        calibration = None
+        if dtype == "int8_calib":
+            zyx, lo, hi = _quantize_calibrated_u8(zyx)
+            calibration = (lo, hi)
+        elif dtype != "native":
+            zyx = _cast_stack(zyx, target_dtype)
+
+        description = None
+        if scene_tree is not None:
+            description = _channel_ome_xml(scene_tree, scene_index, c, zyx, calibration)
+
+        # The bounds normally live in the OME-XML annotation; when there is
+        # no tree to carry them, print regardless of verbosity so the lossy
+        # rescale stays interpretable
+        if calibration is not None and (verbose or description is None):
+            print(f"  Calibration for {out_path.name}: "
+                  f"[{calibration[0]:.6g}, {calibration[1]:.6g}] -> 0-255")
+
+        # With a pre-built description tifffile just writes the bytes
+        # (ome=False); otherwise fall back to letting it emit the OME-XML
+        # itself, which still skips OmeTiffWriter's per-call option parsing
+        # and writer construction
+        with open(out_path, "wb", buffering=_WRITE_BUFFER_BYTES) as fh, \
+                tifffile.TiffWriter(fh, bigtiff=bigtiff, ome=description is None) as writer:
+            if description is not None:
+                writer.write(zyx, photometric="minisblack", description=description, metadata=None)
+            else:
+                writer.write(zyx, photometric="minisblack", metadata={"axes": "ZYX"})
+
+        written.append(out_path)
+        if verbose:
+            print(f"  Saved: {out_path}")
+    return written
+
+
 def _normalize_cli_names(arg_list: Optional[list[str]]) -> Optional[list[str]]:
     """
     Accepts:
@@ -57,10 +288,11 @@ def split_lif_to_channels(
     outdir: Optional[str | Path] = None,
     *,
     bigtiff: bool = False,
-    dtype: str = "native",  # one of {"native","uint16","uint8","float32"}
+    dtype: str = "native",  # one of {"native","uint16","uint8","float32","int8_calib"}
     include_empty: bool = False,
     verbose: bool = True,
     channel_names: Optional[Iterable[str]] = None,  # <-- NEW
+    jobs: Optional[int] = None,
 ) -> List[Path]:
     """
     Convert a Leica .lif into per-channel OME-TIFF Z-stacks for every scene.
@@ -74,7 +306,9 @@ def split_lif_to_channels(
     bigtiff : bool
         Force BigTIFF writing.
     dtype : str
-        Optional cast before writing. One of: "native", "uint16", "uint8", "float32".
+        Optional cast before writing. One of: "native", "uint16", "uint8",
+        "float32", "int8_calib". The last is LOSSY: int8_calib rescales each
+        channel's 0.5-99.5 percentile range onto uint8.
     include_empty : bool
         Keep scenes with zero-sized Z or C (usually skipped).
     verbose : bool
@@ -83,6 +317,8 @@ def split_lif_to_channels(
         Custom names to apply to channels for **all scenes**. If provided and the
         list is shorter than the number of channels in a scene, the remaining
         channels are named by index; if longer, extras are ignored (with a note).
+    jobs : int | None
+        Number of worker threads for the export graph (default: min(8, tasks)).
 
     Returns
     -------
@@ -99,11 +335,14 @@ def split_lif_to_channels(
     # Load via BioIO (auto-detects the LIF reader when bioio-lif is installed)
     img = BioImage(str(lif_path), reader = bioio_lif.Reader)
 
-    def _log(msg: str) -> None:
+    def _log(msg) -> None:
+        # Accepts a string or a zero-arg callable; callables let callers skip
+        # building expensive messages entirely when verbose is off
         if verbose:
-            print(msg)
+            print(msg() if callable(msg) else msg)
 
     written: List[Path] = []
+    tasks: list = []
 
     # Try channel names from metadata (may be None)
     try:
@@ -115,16 +354,20 @@ def split_lif_to_channels(
     override_names = list(channel_names) if channel_names else None
 
     _log(f"Opened: {lif_path}")
-    _log(f"Scenes: {len(img.scenes)}  Dims: {''.join(_dim_labels(img.dims))}  Shape: {img.dask_data.shape}")
+    # Lambda: img.dask_data builds a dask graph just to report the shape
+    _log(lambda: f"Scenes: {len(img.scenes)}  Dims: {''.join(_dim_labels(img.dims))}  Shape: {img.dask_data.shape}")
     if base_channel_names:
         _log(f"Channel names (first scene): {base_channel_names}")
     if override_names:
         _log(f"Custom channel names override: {override_names}")
 
-    # dtype map
+    # dtype map ("int8_calib" is handled separately: it needs per-channel
+    # percentile calibration, not a plain cast)
     dtype_map = {"uint16": np.uint16, "uint8": np.uint8, "float32": np.float32}
-    if dtype != "native" and dtype not in dtype_map:
-        raise ValueError(f"Unsupported dtype '{dtype}'. Choose one of: native, {', '.join(dtype_map.keys())}")
+    if dtype not in ("native", "int8_calib") and dtype not in dtype_map:
+        raise ValueError(
+            f"Unsupported dtype '{dtype}'. Choose one of: native, uint16, uint8, float32, int8_calib"
+        )
 
     for scene in img.scenes:
         img.set_scene(scene)
@@ -161,38 +404,59 @@ def split_lif_to_channels(
         else:
             scene_names = scene_channel_names if scene_channel_names else [None] * nC
 
-        _log(f"Scenes: {len(img.scenes)}  Dims: {''.join(_dim_labels(img.dims))}  Shape: {img.dask_data.shape}")
+        # bioio-lif does seek/decode bookkeeping on every get_image_data call,
+        # so tasks fetch the whole CZYX block per timepoint and slice channels
+        # from it, unless the block is too large for the task's share of the
+        # memory budget -- that share depends on the concurrency, so specs
+        # carry the block size and the flag is resolved at dispatch below.
+        block_bytes = nC * nZ * size_map.get("Y", 1) * size_map.get("X", 1) * img.dtype.itemsize
 
+        # One delayed task per (scene, timepoint); each task decodes and
+        # writes all channels of that timepoint with its own BioImage, so
+        # scenes no longer serialize behind one shared reader.
         for t in range(nT):
+            channel_paths = []
             for c in range(nC):
-                # Pull out a single channel ZYX stack at time t (if T exists)
-                if "T" in labels:
-                    zyx = img.get_image_data("ZYX", T=t, C=c)
-                else:
-                    zyx = img.get_image_data("ZYX", C=c)
-
-                # Optional dtype cast
-                if dtype != "native":
-                    zyx = zyx.astype(dtype_map[dtype], copy=False)
-
                 # Channel name (safe)
                 if scene_names and scene_names[c]:
                     ch_part = f"_ch-{_safe(scene_names[c])}"
                 else:
                     ch_part = f"_c{c:02d}"
 
-                fname = f"{lif_path.stem}_scene-{_safe(scene)}{ch_part}.ome.tif"
-                out_path = scene_dir / fname
-
-                OmeTiffWriter.save(
-                    zyx,
-                    uri=str(out_path),
-                    dim_order="ZYX",
-                    bigtiff=bigtiff,
-                )
-
-                written.append(out_path)
-                _log(f"  Saved: {out_path}")
+                # Timepoint goes in the name whenever there are several, both
+                # to actually keep one file per T and because concurrent
+                # tasks must never share an output path
+                t_part = f"_t{t:03d}" if nT > 1 else ""
+                fname = f"{lif_path.stem}_scene-{_safe(scene)}{t_part}{ch_part}.ome.tif"
+                channel_paths.append(scene_dir / fname)
+
+            tasks.append((
+                lif_path, scene, t, "T" in labels, channel_paths,
+                dtype, dtype_map.get(dtype), bigtiff, block_bytes, verbose,
+            ))
+
+    def _with_batch_read(spec, limit):
+        # Replace the block size in the spec with the batch_read decision now
+        # that the per-task share of the memory budget is known
+        return spec[:8] + (spec[8] <= limit,) + spec[9:]
+
+    if len(tasks) == 1 and len(img.scenes) == 1:
+        # Fast path for the common single-stack LIF: one scene, one
+        # timepoint. Write straight through the reader that is already open
+        # instead of building a one-node graph and reopening the file.
+        written.extend(_export_timepoint(*_with_batch_read(tasks[0], _BATCH_READ_LIMIT_BYTES), img=img))
+    elif tasks:
+        num_workers = jobs if jobs else min(8, len(tasks))
+        # Threads (not processes): decode and tile compression release the
+        # GIL, and threads share the page cache for the input file
+        per_task_limit = _BATCH_READ_LIMIT_BYTES // num_workers
+        delayed_tasks = [
+            dask.delayed(_export_timepoint)(*_with_batch_read(spec, per_task_limit))
+            for spec in tasks
+        ]
+        results = dask.compute(*delayed_tasks, scheduler="threads", num_workers=num_workers)
+        for paths in results:
+            written.extend(paths)
 
     _log(f"\nDone. Wrote {len(written)} file(s) to: {outdir}")
     return written
@@ -209,10 +473,14 @@ def _build_argparser() -> argparse.ArgumentParser:
     p.add_argument("--bigtiff", action="store_true", help="Force BigTIFF writing")
     p.add_argument(
         "--dtype",
-        choices=["native", "uint16", "uint8", "float32"],
+        choices=["native", "uint16", "uint8", "float32", "int8_calib"],
         default="native",
-        help="Optional cast before writing (default: native)",
+        help="Optional cast before writing (default: native). WARNING: int8_calib is LOSSY; "
+             "it rescales each channel's 0.5-99.5 percentile range onto uint8 and logs the "
+             "calibration bounds.",
     )
+    p.add_argument("-j", "--jobs", type=int, default=None,
+                   help="Number of worker threads for the export graph (default: min(8, tasks))")
     p.add_argument("--include-empty", action="store_true", help="Keep scenes with zero-sized Z or C (debugging)")
     p.add_argument("--quiet", action="store_true", help="Reduce logging")
     # NEW: custom names
@@ -235,6 +503,7 @@ def main(argv: Optional[Iterable[str]] = None) -> None:
         include_empty=args.include_empty,
         verbose=not args.quiet,
         channel_names=_normalize_cli_names(args.channel_names),  # <-- NEW
+        jobs=args.jobs,
     )
 
 
@@ -2,26 +2,31 @@
 
 
 import os
-import numpy as np
 import argparse
+import dask.array as da
+import numpy as np
+import tifffile
 from bioio import BioImage
-from bioio.writers import OmeTiffWriter
 
-def merge_channels(file1, file2, output_path, channel_names=None):
+def merge_channels(file1, file2, output_path, channel_names=None, compression="deflate", threads=None,
+                   tile_size=1024):
     """Merge two OME-TIFF files by stacking the channels together."""
     try:
-        # Read both files using bioio
+        # Read both files using bioio, keeping the pixel data dask-lazy so the
+        # inputs are never fully decompressed into RAM at the same time
         im1 = BioImage(file1)  # Shape (Z, Y, X)
         im2 = BioImage(file2)  # Shape (Z, Y, X)
-        data1 = im1.data.squeeze()  # Remove singleton dimensions
-        data2 = im2.data.squeeze()
+        data1 = im1.dask_data.squeeze()  # Remove singleton dimensions
+        data2 = im2.dask_data.squeeze()
 
-        # Check if both files have the same Z, Y, X dimensions
+        # Check if both files have the same Z, Y, X dimensions (shape is known
+        # from metadata, so this fails fast without computing any pixels)
         if data1.shape != data2.shape:
             raise ValueError("The dimensions of the input files do not match.")
 
-        # Stack the two channels along a new axis to get (C, Z, Y, X)
-        merged_data = np.stack([data1, data2], axis=0)  # Shape (C, Z, Y, X)
+        # Stack the two channels along a new axis to get (C, Z, Y, X); still
+        # lazy, the writer pulls chunks through as it streams them to disk
+        merged_data = da.stack([data1, data2], axis=0)  # Shape (C, Z, Y, X)
 
         # Use provided channel names or default to names from input images
         if channel_names:
@@ -29,12 +34,30 @@ def merge_channels(file1, file2, output_path, channel_names=None):
         else:
             channel_names_list = [im1.channel_names[0], im2.channel_names[0]]
 
-        # Save the merged data as an OME-TIFF file using bioio
-        OmeTiffWriter.save(
-            merged_data,
+        # Stream tiles through tifffile so the merged stack is never
+        # materialized; tiles go in C order per plane, and edge tiles may be
+        # smaller (the writer pads them)
+        def _tiles():
+            for channel in (data1, data2):
+                for z in range(channel.shape[0]):
+                    plane = np.asarray(channel[z])
+                    for ty in range(0, plane.shape[0], tile_size):
+                        for tx in range(0, plane.shape[1], tile_size):
+                            yield plane[ty:ty + tile_size, tx:tx + tile_size]
+
+        tifffile.imwrite(
             output_path,
-            dim_order="CZYX",
-            channel_names=channel_names_list
+            data=_tiles(),
+            shape=merged_data.shape,
+            dtype=merged_data.dtype,
+            tile=(tile_size, tile_size),
+            # Explicit: imwrite only infers OME mode from a .ome.tif name,
+            # and merge outputs are often plain .tif/.tiff
+            ome=True,
+            photometric="minisblack",
+            compression=None if compression == "none" else compression,
+            maxworkers=threads if threads else os.cpu_count(),
+            metadata={"axes": "CZYX", "Channel": {"Name": channel_names_list}},
         )
         print(f"Merged files saved to {output_path}")
     except Exception as e:
@@ -50,6 +73,25 @@ if __name__ == "__main__":
         help="Comma-separated list of channel names (e.g., 'Channel 1,Channel 2'). If not provided, defaults to names from input files.",
         default=None
     )
+    parser.add_argument(
+        "--compression",
+        choices=["deflate", "lzw", "zstd", "none"],
+        default="deflate",
+        help="Compression codec for the merged OME-TIFF (default: deflate)."
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Number of threads for segment compression (default: number of CPUs)."
+    )
+    parser.add_argument(
+        "--tile",
+        type=int,
+        default=1024,
+        help="Tile edge length in pixels for the tiled OME-TIFF output (default: 1024)."
+    )
     args = parser.parse_args()
 
-    merge_channels(args.file1, args.file2, args.output_path, args.channel_names)
+    merge_channels(args.file1, args.file2, args.output_path, args.channel_names,
+                   args.compression, args.threads, args.tile)
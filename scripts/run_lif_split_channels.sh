@@ -10,7 +10,7 @@ CHANNEL_NAMES="DAPI,Cy3,Cy5"  # Comma-separated channel names, or leave empty fo
 
 # Optional parameters
 BIGTIFF_FLAG=""              # Set to "--bigtiff" if you want to force BigTIFF writing
-DTYPE="native"              # Options: native, uint16, uint8, float32
+DTYPE="native"              # Options: native, uint16, uint8, float32, int8_calib (int8_calib is lossy)
 INCLUDE_EMPTY_FLAG=""       # Set to "--include-empty" to keep empty scenes
 
 # Function to check if Docker is running
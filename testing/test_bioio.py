@@ -8,10 +8,10 @@ test_file = os.path.join(test_dir, "Sample 1.nd2")
 img = BioImage(test_file)
 
 # %%
-import xml.dom.minidom
+from lxml import etree
 meta = img.metadata.to_xml()
-parsed = xml.dom.minidom.parseString(str(meta))
-pretty = parsed.toprettyxml()
+root = etree.fromstring(meta.encode())
+pretty = etree.tostring(root, pretty_print=True, encoding="unicode")
 print(pretty)
 
 # %%